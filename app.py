@@ -5,33 +5,69 @@ FastAPI application for fraud detection predictions
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, Response
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, Field, validator, ConfigDict
+from pydantic import BaseModel, Field, field_validator, ValidationInfo, ConfigDict
 from typing import Optional, List
 import joblib
-import pandas as pd
 import numpy as np
+import orjson
 from datetime import datetime
 import time
 import os
-from contextlib import asynccontextmanager
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
 import logging
+import warnings
+from preprocess_kernels import FEATURES, MODEL_INPUT_DTYPE, fill_features, warm_up
+from onnx_model import OnnxModel, SOURCE_HASH_KEY, file_sha256
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Models are fitted on DataFrames but served plain arrays in feature_names order
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
 # Global variables for model and preprocessing
 model = None
-label_encoders = {}
 feature_names = []
+feature_index = {}  # Feature name -> column position in the model input
+feature_columns = np.full(len(FEATURES), -1, dtype=np.int64)  # Model column of each kernel feature
+derived_columns = ()  # (request field, model column) for client-overridable derived features the model uses
+fraud_class_index = 1  # Column of the fraud class in predict_proba output
+FRAUD_THRESHOLD = 0.5  # Probability at which a transaction is flagged as fraud
+
+# Dynamic batching of concurrent /predict requests
+MAX_BATCH = int(os.environ.get("PREDICT_MAX_BATCH", 64))  # Maximum transactions per model call
+MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", 0))  # Extra time to wait for more requests to join a batch (0: only those already queued)
+prediction_queue = None
+batch_worker_task = None
+
+def env_count(name: str, default: int) -> int:
+    """Positive integer setting from the environment (values below 1 are raised to 1)"""
+    value = os.environ.get(name)
+    if value is None:
+        return max(1, default)
+    try:
+        return max(1, int(value))
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}") from None
+
+
+# Threads running model inference off the event loop; by default the cores are split
+# between the WEB_CONCURRENCY workers, so all workers together use about one thread per core
+WORKER_COUNT = env_count("WEB_CONCURRENCY", 1)
+INFERENCE_THREADS = env_count("INFERENCE_THREADS", (os.cpu_count() or 1) // WORKER_COUNT)
+inference_pool = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Load model on startup"""
-    global model, label_encoders, feature_names
+    global model, feature_names, feature_index, feature_columns, derived_columns, fraud_class_index, prediction_queue, batch_worker_task, inference_pool
     
     try:
         model_path = os.path.join("Models", "fraud_detection_model.pkl")
@@ -60,17 +96,76 @@ async def lifespan(app: FastAPI):
                     'Authentication_Method'
                 ]
             
+            feature_index = {name: i for i, name in enumerate(feature_names)}
+            feature_columns = np.array([feature_index.get(name, -1) for name in FEATURES], dtype=np.int64)
             logger.info(f"Feature names: {feature_names}")
+            
+            # Resolve request field -> model column once, for only the features the model uses
+            derived_columns = tuple(
+                (field, feature_index[name]) for field, name in DERIVED_FEATURE_FIELDS.items()
+                if name in feature_index
+            )
+            
+            # Features the model expects but we don't produce (e.g. the transaction context
+            # fields, which would need the model's own encoders) stay at 0.0
+            missing_features = [f for f in feature_names if f not in FEATURES]
+            if missing_features:
+                logger.warning(f"Model expects features the API doesn't produce: {missing_features}. They are sent as 0.0")
+            
+            # Locate the fraud class so is_fraud can be derived from predict_proba alone
+            if hasattr(model, 'classes_'):
+                fraud_class_index = find_fraud_class_index(model.classes_)
+            
+            # Serve through ONNX Runtime when the model converts, else keep the joblib model
+            onnx_path = os.path.join("Models", "fraud_detection_model.onnx")
+            onnx_threads = int(os.environ.get("ONNX_INTRA_OP_THREADS", 1))
+            try:
+                onnx_model = None
+                if os.path.exists(onnx_path):
+                    onnx_model = OnnxModel(onnx_path, model.classes_, feature_names, intra_op_num_threads=onnx_threads)
+                    if onnx_model.metadata.get(SOURCE_HASH_KEY) != file_sha256(model_path):
+                        logger.warning(f"{onnx_path} was not converted from {model_path}; run convert_to_onnx.py")
+                        onnx_model = None
+                if onnx_model is None:
+                    # Convert in memory for this run; the converters are only imported when needed
+                    from convert_to_onnx import convert
+                    logger.info("Converting model to ONNX")
+                    onnx_model = OnnxModel(
+                        convert(model_path).SerializeToString(), model.classes_, feature_names,
+                        intra_op_num_threads=onnx_threads
+                    )
+                model = onnx_model
+                logger.info("Serving predictions with ONNX Runtime")
+            except Exception as e:
+                logger.warning(f"Could not load ONNX model, using joblib model: {str(e)}")
+            
+            # Compile the feature kernels now so the first request doesn't pay for it
+            warm_up(len(feature_names))
         
     except Exception as e:
         logger.error(f"Error loading model: {str(e)}")
         logger.warning("App will start but prediction endpoints will return 503")
         model = None
     
+    # Start the inference threads and the dynamic batching worker for single predictions
+    if model is not None:
+        inference_pool = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="inference")
+        prediction_queue = asyncio.Queue()
+        batch_worker_task = asyncio.create_task(batch_prediction_worker(prediction_queue))
+    
     yield
     
     # Cleanup on shutdown
     logger.info("Shutting down...")
+    if batch_worker_task is not None:
+        batch_worker_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await batch_worker_task
+        batch_worker_task = None
+        prediction_queue = None
+    if inference_pool is not None:
+        inference_pool.shutdown()
+        inference_pool = None
 
 
 # Initialize FastAPI app
@@ -97,6 +192,52 @@ except Exception as e:
     logger.warning(f"Could not mount static files: {str(e)}")
 
 
+class OrjsonResponse(JSONResponse):
+    """JSON response rendered with orjson (also serializes NumPy values natively)"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+class OrjsonRequest(Request):
+    """Request whose JSON body is parsed with orjson"""
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            # orjson.JSONDecodeError subclasses json.JSONDecodeError, so bad bodies still get a 422
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+
+class OrjsonRoute(APIRoute):
+    """Route that hands its endpoint an OrjsonRequest"""
+
+    def get_route_handler(self):
+        route_handler = super().get_route_handler()
+
+        async def orjson_route_handler(request: Request) -> Response:
+            return await route_handler(OrjsonRequest(request.scope, request.receive))
+
+        return orjson_route_handler
+
+
+# Parse request bodies with orjson on every route declared below
+app.router.route_class = OrjsonRoute
+
+
+# Allowed values for the categorical transaction fields: the training data's categories (hashed O(1) lookups)
+ALLOWED_CATEGORIES = {
+    'transaction_type': frozenset({'ATM Withdrawal', 'Bank Transfer', 'Online', 'POS'}),
+    'device_type': frozenset({'Laptop', 'Mobile', 'Tablet'}),
+    'card_type': frozenset({'Amex', 'Discover', 'Mastercard', 'Visa'}),
+    'authentication_method': frozenset({'Biometric', 'OTP', 'PIN', 'Password'})
+}
+CATEGORY_ERRORS = {
+    field: f"{field} must be one of: {', '.join(sorted(allowed))}"
+    for field, allowed in ALLOWED_CATEGORIES.items()
+}
+
+
 # Request/Response Models
 class TransactionRequest(BaseModel):
     """Transaction data for fraud prediction - only essential features"""
@@ -115,6 +256,21 @@ class TransactionRequest(BaseModel):
     amount_deviation: Optional[float] = Field(None, description="Amount deviation (auto-calculated)")
     risk_amount_interaction: Optional[float] = Field(None, description="Risk-amount interaction (auto-calculated)")
     
+    # Optional transaction context (validated, not used by the current model)
+    transaction_type: Optional[str] = Field(None, description="Transaction type (ATM Withdrawal, Bank Transfer, Online, POS). Ignored by the model")
+    device_type: Optional[str] = Field(None, description="Device type (Laptop, Mobile, Tablet). Ignored by the model")
+    card_type: Optional[str] = Field(None, description="Card type (Amex, Discover, Mastercard, Visa). Ignored by the model")
+    authentication_method: Optional[str] = Field(None, description="Authentication method (Biometric, OTP, PIN, Password). Ignored by the model")
+    ip_address_flag: Optional[int] = Field(None, ge=0, le=1, description="Suspicious IP address flag (0 or 1). Ignored by the model")
+    
+    @field_validator('transaction_type', 'device_type', 'card_type', 'authentication_method')
+    @classmethod
+    def validate_category(cls, v: Optional[str], info: ValidationInfo) -> Optional[str]:
+        """Reject unknown categorical values"""
+        if v is not None and v not in ALLOWED_CATEGORIES[info.field_name]:
+            raise ValueError(CATEGORY_ERRORS[info.field_name])
+        return v
+    
     model_config = ConfigDict(
         json_schema_extra={
             "example": {
@@ -160,72 +316,157 @@ class BatchPredictionResponse(BaseModel):
     response_time_ms: float
 
 
+def find_fraud_class_index(classes) -> int:
+    """Column of the fraud class (label 1) in predict_proba output
+
+    Binary models with other labels (e.g. '0'/'1') use their second class, as scikit-learn
+    does for the positive class; anything else is rejected rather than guessed
+    """
+    classes = list(classes)
+    if 1 in classes:
+        return classes.index(1)
+    if len(classes) == 2:
+        logger.warning(f"Model classes {classes} don't include 1; using {classes[1]!r} as the fraud class")
+        return 1
+    raise ValueError(f"Cannot identify the fraud class among model classes {classes}")
+
+
+# Derived features a client may send precomputed: request field -> model feature
+DERIVED_FEATURE_FIELDS = {
+    'high_failure_flag': 'High_Failure_Flag',
+    'failure_rate': 'Failure_Rate',
+    'amount_deviation': 'Amount_Deviation',
+    'risk_amount_interaction': 'Risk_Amount_Interaction'
+}
+
 # Helper function to preprocess transaction data
-def preprocess_transaction(transaction: TransactionRequest) -> pd.DataFrame:
-    """Convert transaction request to DataFrame with proper feature order"""
-    from datetime import datetime
-    
-    # Get Hour and Month (use provided values or current time)
-    now = datetime.now()
-    hour = transaction.hour if transaction.hour is not None else now.hour
-    month = transaction.month if transaction.month is not None else now.month
-    
-    # Calculate derived features (use provided values if sent, otherwise calculate)
-    failed_count = transaction.failed_transaction_count_7d
-    daily_count = transaction.daily_transaction_count
-    
-    # High_Failure_Flag: 1 if failed transactions > 0, else 0
-    high_failure_flag = transaction.high_failure_flag if transaction.high_failure_flag is not None else (1 if failed_count > 0 else 0)
-    
-    # Failure_Rate: failed transactions / daily transactions (avoid division by zero)
-    failure_rate = transaction.failure_rate if transaction.failure_rate is not None else (failed_count / daily_count if daily_count > 0 else 0.0)
-    
-    # Amount_Deviation: difference between current and average
-    amount_deviation = transaction.amount_deviation if transaction.amount_deviation is not None else abs(transaction.transaction_amount - transaction.avg_transaction_amount_7d)
-    
-    # Risk_Amount_Interaction: interaction between risk score and amount
-    risk_amount_interaction = transaction.risk_amount_interaction if transaction.risk_amount_interaction is not None else (transaction.risk_score * transaction.transaction_amount)
-    
-    # Build feature dictionary matching model expectations (exact order)
-    data = {
-        'Failed_Transaction_Count_7d': [failed_count],
-        'Risk_Score': [transaction.risk_score],
-        'High_Failure_Flag': [high_failure_flag],
-        'Transaction_Amount': [transaction.transaction_amount],
-        'Avg_Transaction_Amount_7d': [transaction.avg_transaction_amount_7d],
-        'Risk_Amount_Interaction': [risk_amount_interaction],
-        'Amount_Deviation': [amount_deviation],
-        'Failure_Rate': [failure_rate],
-        'Hour': [hour],
-        'Card_Age': [transaction.card_age],
-        'Month': [month]
-    }
-    
-    df = pd.DataFrame(data)
-    
-    # Reorder columns to match model expectations if feature_names is available
-    if feature_names:
-        # Ensure all required features are present
-        missing_features = [f for f in feature_names if f not in df.columns]
-        if missing_features:
-            logger.warning(f"Missing features: {missing_features}. Using defaults.")
-            # Add missing features with default values
-            for feat in missing_features:
-                df[feat] = 0.0
-        
-        # Reorder to match model's expected feature order
-        df = df[feature_names]
-    
-    return df
+def preprocess_transaction(transaction: TransactionRequest, now: datetime) -> np.ndarray:
+    """Convert transaction request to a (1, n_features) array with proper feature order
+
+    Goes through the batch kernel, so single and batched requests share one feature definition
+    """
+    return preprocess_batch([transaction], now)
+
+
+# Helper function to preprocess a batch of transactions in one pass
+def preprocess_batch(transactions: List[TransactionRequest], now: datetime) -> np.ndarray:
+    """Convert a list of transaction requests to a single (n_transactions, n_features) array
+
+    now supplies the default Hour/Month for every transaction in the batch
+    """
+    # Build each input column once (one list comprehension per feature)
+    amount = np.asarray([t.transaction_amount for t in transactions], dtype=np.float64)
+    avg_7d = np.asarray([t.avg_transaction_amount_7d for t in transactions], dtype=np.float64)
+    failed = np.asarray([t.failed_transaction_count_7d for t in transactions], dtype=np.float64)
+    daily = np.asarray([t.daily_transaction_count for t in transactions], dtype=np.float64)
+    risk = np.asarray([t.risk_score for t in transactions], dtype=np.float64)
+    card_age = np.asarray([t.card_age for t in transactions], dtype=np.float64)
+    hour = np.asarray([now.hour if t.hour is None else t.hour for t in transactions], dtype=np.float64)
+    month = np.asarray([now.month if t.month is None else t.month for t in transactions], dtype=np.float64)
+
+    # Compute all features for every row in one compiled loop
+    X = np.zeros((len(transactions), len(feature_names)), dtype=MODEL_INPUT_DTYPE)
+    fill_features(X, feature_columns, failed, daily, amount, avg_7d, risk, card_age, hour, month)
+
+    # Use derived features sent by the client instead of the calculated ones
+    for field, idx in derived_columns:
+        values = [getattr(t, field) for t in transactions]
+        rows = [i for i, value in enumerate(values) if value is not None]
+        if rows:
+            X[rows, idx] = [values[i] for i in rows]
+
+    return X
+
+
+async def predict_proba_async(X: np.ndarray) -> np.ndarray:
+    """Run model.predict_proba on the inference thread pool, keeping the event loop free"""
+    return await asyncio.get_running_loop().run_in_executor(inference_pool, model.predict_proba, X)
+
+
+async def run_prediction_batch(items: list):
+    """Predict one collected batch and resolve each request's future"""
+    try:
+        X = preprocess_batch([transaction for transaction, _ in items], datetime.now())
+        probabilities = await predict_proba_async(X)
+        for (_, future), fraud_probability in zip(items, probabilities[:, fraud_class_index]):
+            if not future.done():
+                future.set_result(float(fraud_probability))
+    except Exception as e:
+        logger.error(f"Batched prediction error: {str(e)}")
+        for _, future in items:
+            if not future.done():
+                future.set_exception(e)
+
+
+async def batch_prediction_worker(queue: asyncio.Queue):
+    """Coalesce queued single predictions into one model call per batch
+
+    Up to INFERENCE_THREADS batches run at once, so the next batch is collected while
+    earlier ones are still in the inference pool
+    """
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(INFERENCE_THREADS)
+    running = set()
+
+    try:
+        while True:
+            # Wait for a free inference thread before collecting, so requests keep queueing meanwhile
+            await slots.acquire()
+
+            # Wait for the first request and take whatever else is already queued
+            items = [await queue.get()]
+            while len(items) < MAX_BATCH and not queue.empty():
+                items.append(queue.get_nowait())
+
+            # Then collect more until the batch is full or the window closes
+            deadline = loop.time() + MAX_WAIT_MS / 1000
+            while len(items) < MAX_BATCH:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Skip requests whose clients have already gone away
+            items = [(transaction, future) for transaction, future in items if not future.done()]
+            if not items:
+                slots.release()
+                continue
+
+            task = asyncio.create_task(run_prediction_batch(items))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+    finally:
+        for task in running:
+            task.cancel()
+
+
+async def predict_with_batching(transaction: TransactionRequest) -> float:
+    """Submit a transaction to the batching worker and wait for its fraud probability"""
+    future = asyncio.get_running_loop().create_future()
+    await prediction_queue.put((transaction, future))
+    return await future
+
+
+async def predict_batch_probabilities(transactions: List[TransactionRequest], now: datetime) -> np.ndarray:
+    """Fraud probability of each transaction, from a single model call over all rows"""
+    X = preprocess_batch(transactions, now)
+    return (await predict_proba_async(X))[:, fraud_class_index]
 
 
 # Middleware to measure response time
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
+    # Only prediction routes are timed; health, metrics and static files skip the overhead
+    if not request.url.path.startswith("/predict"):
+        return await call_next(request)
+    start_ns = time.perf_counter_ns()
     response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
+    process_time = (time.perf_counter_ns() - start_ns) / 1_000_000_000
+    response.headers["X-Process-Time"] = f"{process_time:.6f}"
     return response
 
 
@@ -251,7 +492,7 @@ async def serve_web_interface():
         }
 
 # API root endpoint
-@app.get("/api", tags=["General"])
+@app.get("/api", response_class=OrjsonResponse, tags=["General"])
 async def api_root():
     """API root endpoint"""
     return {
@@ -299,25 +540,32 @@ async def predict_fraud(transaction: TransactionRequest):
     if model is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
+    now = datetime.now()
     
     try:
-        # Preprocess transaction
-        df = preprocess_transaction(transaction)
+        if prediction_queue is not None:
+            # Share a model call with other concurrent requests
+            fraud_probability = await predict_with_batching(transaction)
+        else:
+            # Preprocess transaction
+            X = preprocess_transaction(transaction, now)
+
+            # Make prediction (in a worker thread so the event loop stays responsive)
+            fraud_probability = (await predict_proba_async(X))[0, fraud_class_index]
         
-        # Make prediction
-        fraud_probability = model.predict_proba(df)[0][1]
-        is_fraud = model.predict(df)[0] == 1
+        # is_fraud comes from the same probabilities; no separate model.predict call
+        is_fraud = fraud_probability >= FRAUD_THRESHOLD
         confidence = abs(fraud_probability - 0.5) * 2  # Normalize to 0-1
         
-        response_time = (time.time() - start_time) * 1000  # Convert to milliseconds
+        response_time = (time.perf_counter_ns() - start_ns) / 1_000_000  # Convert to milliseconds
         
         return PredictionResponse(
             fraud_probability=float(fraud_probability),
             is_fraud=bool(is_fraud),
             confidence=float(confidence),
             response_time_ms=round(response_time, 2),
-            timestamp=datetime.now().isoformat()
+            timestamp=now.isoformat()
         )
     
     except Exception as e:
@@ -335,46 +583,85 @@ async def predict_fraud_batch(batch_request: BatchPredictionRequest):
     if model is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
-    if len(batch_request.transactions) > 100:
-        raise HTTPException(status_code=400, detail="Maximum 100 transactions per batch")
-    
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
+    now = datetime.now()
+    timestamp = now.isoformat()  # Shared by every prediction in the batch
     predictions = []
-    total_fraud = 0
-    
+
     try:
-        for transaction in batch_request.transactions:
-            df = preprocess_transaction(transaction)
-            fraud_probability = model.predict_proba(df)[0][1]
-            is_fraud = model.predict(df)[0] == 1
-            confidence = abs(fraud_probability - 0.5) * 2
-            
-            if is_fraud:
-                total_fraud += 1
-            
-            predictions.append(PredictionResponse(
-                fraud_probability=float(fraud_probability),
-                is_fraud=bool(is_fraud),
-                confidence=float(confidence),
-                response_time_ms=0,  # Individual time not tracked in batch
-                timestamp=datetime.now().isoformat()
-            ))
-        
-        response_time = (time.time() - start_time) * 1000
-        
-        return BatchPredictionResponse(
-            predictions=predictions,
-            total_transactions=len(predictions),
-            total_fraud_detected=total_fraud,
-            response_time_ms=round(response_time, 2)
-        )
+        if batch_request.transactions:
+            fraud_probabilities = await predict_batch_probabilities(batch_request.transactions, now)
+            is_fraud = fraud_probabilities >= FRAUD_THRESHOLD
+            confidences = np.abs(fraud_probabilities - 0.5) * 2
+
+            # Plain dicts of already-typed values: no per-item model instances to build or re-validate
+            predictions = [
+                {
+                    "fraud_probability": fraud_probability,
+                    "is_fraud": fraud,
+                    "confidence": confidence,
+                    "response_time_ms": 0.0,  # Individual time not tracked in batch
+                    "timestamp": timestamp
+                }
+                for fraud_probability, fraud, confidence in zip(
+                    fraud_probabilities.tolist(), is_fraud.tolist(), confidences.tolist()
+                )
+            ]
+            total_fraud = int(is_fraud.sum())
+        else:
+            total_fraud = 0
+
+        response_time = (time.perf_counter_ns() - start_ns) / 1_000_000
+
+        # Returned as a response so FastAPI skips response_model validation (which still documents the schema)
+        return OrjsonResponse({
+            "predictions": predictions,
+            "total_transactions": len(predictions),
+            "total_fraud_detected": total_fraud,
+            "response_time_ms": round(response_time, 2)
+        })
+    
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+
+
+@app.post("/predict/batch/stream", tags=["Prediction"])
+async def predict_fraud_batch_stream(batch_request: BatchPredictionRequest):
+    """
+    Predict fraud for multiple transactions, streamed back as NDJSON
+    
+    Returns one prediction object per line, in request order. Maximum 100 transactions per batch
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
     
+    now = datetime.now()
+    timestamp = now.isoformat()  # Shared by every prediction in the batch
+    
+    try:
+        if batch_request.transactions:
+            fraud_probabilities = await predict_batch_probabilities(batch_request.transactions, now)
+        else:
+            fraud_probabilities = np.empty(0)
     except Exception as e:
         logger.error(f"Batch prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+    
+    async def generate_predictions():
+        for fraud_probability in fraud_probabilities.tolist():
+            yield orjson.dumps({
+                "fraud_probability": fraud_probability,
+                "is_fraud": fraud_probability >= FRAUD_THRESHOLD,
+                "confidence": abs(fraud_probability - 0.5) * 2,
+                "response_time_ms": 0.0,  # Individual time not tracked in batch
+                "timestamp": timestamp
+            }) + b"\n"
+    
+    return StreamingResponse(generate_predictions(), media_type="application/x-ndjson")
 
 
-@app.get("/metrics", tags=["Monitoring"])
+@app.get("/metrics", response_class=OrjsonResponse, tags=["Monitoring"])
 async def get_metrics():
     """Get API metrics"""
     return {
@@ -388,7 +675,7 @@ async def get_metrics():
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return OrjsonResponse(
         status_code=exc.status_code,
         content={
             "error": exc.detail,
@@ -401,7 +688,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unhandled exception: {str(exc)}")
-    return JSONResponse(
+    return OrjsonResponse(
         status_code=500,
         content={
             "error": "Internal server error",
@@ -413,8 +700,8 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 if __name__ == "__main__":
     import uvicorn
-    import os
     # Use PORT environment variable (for Heroku) or default to 8000
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # A single worker unless WEB_CONCURRENCY asks for more; each worker loads its own model in lifespan
+    uvicorn.run("app:app", host="0.0.0.0", port=port, workers=WORKER_COUNT)
 
@@ -0,0 +1,59 @@
+"""
+Convert the trained fraud detection model to ONNX
+Run after retraining: python convert_to_onnx.py
+"""
+
+import os
+
+import joblib
+from onnxmltools.convert.xgboost.operator_converters.XGBoost import convert_xgboost
+from skl2onnx import convert_sklearn, update_registered_converter
+from skl2onnx.common.data_types import FloatTensorType
+from skl2onnx.common.shape_calculator import calculate_linear_classifier_output_shapes
+from xgboost import XGBClassifier
+
+from onnx_model import SOURCE_HASH_KEY, file_sha256
+
+MODEL_PATH = os.path.join("Models", "fraud_detection_model.pkl")
+ONNX_PATH = os.path.join("Models", "fraud_detection_model.onnx")
+
+
+def convert(model_path: str = MODEL_PATH):
+    """Convert the pickled model at model_path to an ONNX ModelProto tagged with its hash"""
+    # skl2onnx needs onnxmltools' converter for XGBoost estimators (e.g. inside a StackingClassifier)
+    update_registered_converter(
+        XGBClassifier, "XGBoostXGBClassifier",
+        calculate_linear_classifier_output_shapes, convert_xgboost,
+        options={"nocl": [True, False], "zipmap": [True, False, "columns"]}
+    )
+
+    model = joblib.load(model_path)
+    n_features = len(model.feature_names_in_)
+
+    # The XGBoost converter expects f0..fN feature names, not the training column names
+    for estimator in getattr(model, "estimators_", [model]):
+        if isinstance(estimator, XGBClassifier):
+            estimator.get_booster().feature_names = None
+
+    onnx_model = convert_sklearn(
+        model,
+        initial_types=[("X", FloatTensorType([None, n_features]))],
+        options={id(model): {"zipmap": False}},
+        target_opset={"": 17, "ai.onnx.ml": 3}
+    )
+    entry = onnx_model.metadata_props.add()
+    entry.key = SOURCE_HASH_KEY
+    entry.value = file_sha256(model_path)
+    return onnx_model
+
+
+def main():
+    """Convert MODEL_PATH to ONNX_PATH"""
+    onnx_model = convert()
+    with open(ONNX_PATH, "wb") as f:
+        f.write(onnx_model.SerializeToString())
+    print(f"Saved {ONNX_PATH}")
+
+
+if __name__ == "__main__":
+    main()
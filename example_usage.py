@@ -96,7 +96,7 @@ def example_batch_prediction():
         {
             "transaction_amount": 5000.00,
             "account_balance": 1000.00,
-            "transaction_type": "Transfer",
+            "transaction_type": "Bank Transfer",
             "device_type": "Tablet",
             "location": "Unknown",
             "merchant_category": "Travel",
@@ -0,0 +1,47 @@
+"""
+ONNX Runtime inference for the Fraud Detection API
+Serves the ONNX export of the model behind the predict_proba interface used by app.py
+"""
+
+import hashlib
+
+import numpy as np
+import onnxruntime as ort
+
+# Metadata key holding the SHA-256 of the pickle the ONNX file was converted from
+SOURCE_HASH_KEY = "source_model_sha256"
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OnnxModel:
+    """Classifier backed by an ONNX Runtime InferenceSession (from a .onnx path or serialized bytes)"""
+
+    def __init__(self, path_or_bytes, classes, feature_names, intra_op_num_threads: int = 1):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_num_threads
+
+        self.session = ort.InferenceSession(path_or_bytes, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = next(
+            (o.name for o in self.session.get_outputs() if 'prob' in o.name),
+            self.session.get_outputs()[-1].name
+        )
+        self.metadata = self.session.get_modelmeta().custom_metadata_map
+
+        # Mirror the scikit-learn attributes app.py relies on
+        self.classes_ = np.asarray(classes)
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities, one row per sample"""
+        # Preprocessing already produces float32, so this is normally a no-op
+        return self.session.run([self.output_name], {self.input_name: X.astype(np.float32, copy=False)})[0]
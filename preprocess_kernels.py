@@ -0,0 +1,70 @@
+"""
+Numba-compiled feature engineering kernels for the Fraud Detection API
+Fill the model input array directly from the raw transaction fields
+"""
+
+import numpy as np
+from numba import njit
+
+# dtype of the model input array: the tree ensembles compare against float32
+# split thresholds, so float32 input is used as-is instead of being converted
+MODEL_INPUT_DTYPE = np.float32
+
+# Order of the features produced by the kernels; column_map[k] gives the
+# model input column for FEATURES[k], or -1 if the model doesn't use it
+FEATURES = (
+    'Failed_Transaction_Count_7d',
+    'Risk_Score',
+    'High_Failure_Flag',
+    'Transaction_Amount',
+    'Avg_Transaction_Amount_7d',
+    'Risk_Amount_Interaction',
+    'Amount_Deviation',
+    'Failure_Rate',
+    'Hour',
+    'Card_Age',
+    'Month',
+)
+
+
+@njit(cache=True, fastmath=True)
+def fill_feature_row(out, i, column_map, failed, daily, amount, avg_7d, risk, card_age, hour, month):
+    """Compute the features of one transaction and write them into row i of out"""
+    values = (
+        failed,
+        risk,
+        (failed > 0) * 1.0,  # Comparison result instead of a branch
+        amount,
+        avg_7d,
+        risk * amount,
+        abs(amount - avg_7d),
+        failed / max(daily, 1.0),  # daily_transaction_count is validated > 0; max only guards the division
+        hour,
+        card_age,
+        month,
+    )
+    for k in range(len(values)):
+        col = column_map[k]
+        if col >= 0:
+            out[i, col] = values[k]
+
+
+@njit(cache=True, fastmath=True)
+def fill_features(out, column_map, failed, daily, amount, avg_7d, risk, card_age, hour, month):
+    """Compute the features of every transaction (one array element per row) into out
+
+    Deliberately serial: batches are at most 100 rows, where a parallel prange loop
+    spends longer starting threads than computing the rows
+    """
+    for i in range(out.shape[0]):
+        fill_feature_row(out, i, column_map, failed[i], daily[i], amount[i], avg_7d[i],
+                         risk[i], card_age[i], hour[i], month[i])
+
+
+def warm_up(n_features: int):
+    """Trigger JIT compilation so the first request doesn't pay for it"""
+    out = np.zeros((1, n_features), dtype=MODEL_INPUT_DTYPE)
+    column_map = np.full(len(FEATURES), -1, dtype=np.int64)
+    column_map[:min(len(FEATURES), n_features)] = np.arange(min(len(FEATURES), n_features))
+    ones = np.ones(1, dtype=np.float64)
+    fill_features(out, column_map, ones, ones, ones, ones, ones, ones, ones, ones)
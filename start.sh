@@ -8,5 +8,5 @@ fi
 
 echo "Starting app on port $PORT"
 
-# Use Python to ensure PORT is properly read
-exec python -c "import os; import uvicorn; port = int(os.environ.get('PORT', 8000)); uvicorn.run('app:app', host='0.0.0.0', port=port)"
+# app.py reads PORT (and WEB_CONCURRENCY for the worker count) from the environment
+exec python app.py
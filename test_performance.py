@@ -3,13 +3,98 @@ Performance testing script for Fraud Detection API
 Measures response times and tests with different transaction types
 """
 
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+import gc
+import math
+import os
+import httpx
+from hdrh.histogram import HdrHistogram
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 import time
-import statistics
-from typing import List, Dict
+from typing import Dict, Tuple
 import json
 
 API_BASE_URL = "http://localhost:8000"
+NS_PER_MS = 1_000_000  # Response times are recorded in integer nanoseconds
+HTTP2_CONNECTIONS = 4  # Connections the HTTP/2 load test multiplexes its requests over
+
+
+class LatencyStats:
+    """Streaming latency statistics: Welford mean/stdev plus an HDR histogram for percentiles
+
+    Memory stays constant however many samples are recorded
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self.mean_ns = 0.0
+        self.m2 = 0.0  # Sum of squared deviations from the running mean
+        self.min_ns = None
+        self.max_ns = None
+        self.histogram = HdrHistogram(1, 60_000_000, 3)  # 1 us .. 60 s, 3 significant figures
+    
+    def record(self, elapsed_ns: int):
+        """Add one response time"""
+        self.count += 1
+        delta = elapsed_ns - self.mean_ns
+        self.mean_ns += delta / self.count
+        self.m2 += delta * (elapsed_ns - self.mean_ns)
+        self.min_ns = elapsed_ns if self.min_ns is None else min(self.min_ns, elapsed_ns)
+        self.max_ns = elapsed_ns if self.max_ns is None else max(self.max_ns, elapsed_ns)
+        self.histogram.record_value(max(1, elapsed_ns // 1000))
+    
+    def percentile(self, percent: float) -> float:
+        """Response time at the given percentile, in ms"""
+        return self.histogram.get_value_at_percentile(percent) / 1000
+    
+    def summary(self) -> Dict:
+        """Summary statistics in ms"""
+        return {
+            "mean": self.mean_ns / NS_PER_MS,
+            "median": self.percentile(50),
+            "min": self.min_ns / NS_PER_MS,
+            "max": self.max_ns / NS_PER_MS,
+            "stdev": math.sqrt(self.m2 / (self.count - 1)) / NS_PER_MS if self.count > 1 else 0,
+            "p95": self.percentile(95),
+            "p99": self.percentile(99)
+        }
+
+
+@contextmanager
+def gc_paused():
+    """Keep the garbage collector from pausing a timed loop; collect once it's done"""
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+        gc.collect()
+
+
+def pin_to_cpu(cpu: int):
+    """Pin this process to one CPU so samples don't include migrations between cores (Linux only)"""
+    try:
+        os.sched_setaffinity(0, {cpu})
+        print(f"Pinned to CPU {cpu}")
+    except AttributeError:
+        print("CPU pinning is not supported on this platform")
+    except OSError as e:
+        print(f"Could not pin to CPU {cpu}: {str(e)}")
+
+
+def create_session() -> requests.Session:
+    """Create an HTTP session that keeps its connection to the API alive between requests"""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=32))
+    # Uncompressed responses: the API is local, so decompressing would only add client CPU time
+    session.headers.update({"Content-Type": "application/json", "Connection": "keep-alive", "Accept-Encoding": "identity"})
+    return session
 
 
 def create_transaction(
@@ -53,50 +138,74 @@ def create_transaction(
     }
 
 
-def test_single_prediction(transaction: Dict, iterations: int = 100) -> Dict:
-    """Test single prediction endpoint performance"""
+# Payload shared by the single, batch and concurrent tests
+STANDARD_TRANSACTION = create_transaction()
+
+
+@lru_cache(maxsize=None)
+def batch_body(batch_size: int) -> bytes:
+    """Serialized batch request of batch_size standard transactions, built once per size"""
+    return orjson.dumps({"transactions": [STANDARD_TRANSACTION] * batch_size})
+
+
+def prepare_post(session: requests.Session, url: str, body: bytes) -> requests.PreparedRequest:
+    """Build a POST once so timed loops skip URL parsing and header merging on every send"""
+    return session.prepare_request(requests.Request("POST", url, data=body))
+
+
+def warm_up(session: requests.Session, prepared: requests.PreparedRequest, requests_count: int):
+    """Send untimed requests so connection setup and cold caches stay out of the measurements"""
+    for _ in range(requests_count):
+        try:
+            session.send(prepared, timeout=10)
+        except requests.RequestException:
+            pass
+    time.sleep(0.05)  # Let the server settle before timing starts
+
+
+def test_single_prediction(session: requests.Session, transaction: Dict, iterations: int = 100, warmup: int = 10) -> Dict:
+    """Test single prediction endpoint performance (statistics cover steady state, after `warmup` untimed requests)"""
     print(f"\n{'='*60}")
     print(f"Testing Single Prediction Endpoint ({iterations} iterations)")
     print(f"{'='*60}")
     
-    response_times = []
-    errors = 0
+    # Serialized and prepared once, outside the timed loop
+    prepared = prepare_post(session, f"{API_BASE_URL}/predict", orjson.dumps(transaction))
+    warm_up(session, prepared, warmup)
+    latencies = LatencyStats()
+    errors_log = []  # Printed after the loop so terminal I/O stays out of the timings
+    first_data = None
     
-    for i in range(iterations):
-        try:
-            start_time = time.time()
-            response = requests.post(
-                f"{API_BASE_URL}/predict",
-                json=transaction,
-                timeout=10
-            )
-            elapsed = (time.time() - start_time) * 1000  # Convert to ms
-            
-            if response.status_code == 200:
-                response_times.append(elapsed)
-                data = response.json()
-                if i == 0:  # Print first response
-                    print(f"\nFirst Response:")
-                    print(f"  Fraud Probability: {data['fraud_probability']:.4f}")
-                    print(f"  Is Fraud: {data['is_fraud']}")
-                    print(f"  Confidence: {data['confidence']:.4f}")
-                    print(f"  Response Time: {data['response_time_ms']:.2f} ms")
-            else:
-                errors += 1
-                print(f"Error on iteration {i+1}: {response.status_code}")
-        except Exception as e:
-            errors += 1
-            print(f"Exception on iteration {i+1}: {str(e)}")
+    with gc_paused():
+        for i in range(iterations):
+            try:
+                start_ns = time.perf_counter_ns()
+                response = session.send(prepared, timeout=10)
+                elapsed = time.perf_counter_ns() - start_ns
+                
+                if response.status_code == 200:
+                    latencies.record(elapsed)
+                    if i == 0:  # Keep the first response; later bodies aren't parsed
+                        first_data = orjson.loads(response.content)
+                else:
+                    errors_log.append(f"Error on iteration {i+1}: {response.status_code}")
+            except Exception as e:
+                errors_log.append(f"Exception on iteration {i+1}: {str(e)}")
+    
+    errors = len(errors_log)
+    for message in errors_log:
+        print(message)
     
-    if response_times:
+    if first_data:
+        print(f"\nFirst Response:")
+        print(f"  Fraud Probability: {first_data['fraud_probability']:.4f}")
+        print(f"  Is Fraud: {first_data['is_fraud']}")
+        print(f"  Confidence: {first_data['confidence']:.4f}")
+        print(f"  Response Time: {first_data['response_time_ms']:.2f} ms")
+    
+    if latencies.count:
         stats = {
-            "mean": statistics.mean(response_times),
-            "median": statistics.median(response_times),
-            "min": min(response_times),
-            "max": max(response_times),
-            "stdev": statistics.stdev(response_times) if len(response_times) > 1 else 0,
-            "p95": sorted(response_times)[int(len(response_times) * 0.95)],
-            "p99": sorted(response_times)[int(len(response_times) * 0.99)],
+            **latencies.summary(),
             "errors": errors,
             "success_rate": (iterations - errors) / iterations * 100
         }
@@ -118,52 +227,53 @@ def test_single_prediction(transaction: Dict, iterations: int = 100) -> Dict:
         return None
 
 
-def test_batch_prediction(batch_size: int = 10, iterations: int = 10) -> Dict:
-    """Test batch prediction endpoint performance"""
+def test_batch_prediction(session: requests.Session, batch_size: int = 10, iterations: int = 10, warmup: int = 10) -> Dict:
+    """Test batch prediction endpoint performance (statistics cover steady state, after `warmup` untimed requests)"""
     print(f"\n{'='*60}")
     print(f"Testing Batch Prediction Endpoint (batch_size={batch_size}, {iterations} iterations)")
     print(f"{'='*60}")
     
-    transaction = create_transaction()
-    batch_request = {"transactions": [transaction] * batch_size}
+    # Serialized and prepared once, outside the timed loop
+    prepared = prepare_post(session, f"{API_BASE_URL}/predict/batch", batch_body(batch_size))
+    warm_up(session, prepared, warmup)
     
-    response_times = []
-    errors = 0
+    latencies = LatencyStats()
+    errors_log = []  # Printed after the loop so terminal I/O stays out of the timings
+    first_data = None
     
-    for i in range(iterations):
-        try:
-            start_time = time.time()
-            response = requests.post(
-                f"{API_BASE_URL}/predict/batch",
-                json=batch_request,
-                timeout=30
-            )
-            elapsed = (time.time() - start_time) * 1000
-            
-            if response.status_code == 200:
-                response_times.append(elapsed)
-                data = response.json()
-                if i == 0:
-                    print(f"\nFirst Response:")
-                    print(f"  Total Transactions: {data['total_transactions']}")
-                    print(f"  Fraud Detected: {data['total_fraud_detected']}")
-                    print(f"  Response Time: {data['response_time_ms']:.2f} ms")
-            else:
-                errors += 1
-        except Exception as e:
-            errors += 1
-            print(f"Exception on iteration {i+1}: {str(e)}")
+    with gc_paused():
+        for i in range(iterations):
+            try:
+                start_ns = time.perf_counter_ns()
+                response = session.send(prepared, timeout=30)
+                elapsed = time.perf_counter_ns() - start_ns
+                
+                if response.status_code == 200:
+                    latencies.record(elapsed)
+                    if i == 0:  # Keep the first response; later bodies aren't parsed
+                        first_data = orjson.loads(response.content)
+                else:
+                    errors_log.append(f"Error on iteration {i+1}: {response.status_code}")
+            except Exception as e:
+                errors_log.append(f"Exception on iteration {i+1}: {str(e)}")
+    
+    errors = len(errors_log)
+    for message in errors_log:
+        print(message)
     
-    if response_times:
+    if first_data:
+        print(f"\nFirst Response:")
+        print(f"  Total Transactions: {first_data['total_transactions']}")
+        print(f"  Fraud Detected: {first_data['total_fraud_detected']}")
+        print(f"  Response Time: {first_data['response_time_ms']:.2f} ms")
+    
+    if latencies.count:
         stats = {
-            "mean": statistics.mean(response_times),
-            "median": statistics.median(response_times),
-            "min": min(response_times),
-            "max": max(response_times),
-            "stdev": statistics.stdev(response_times) if len(response_times) > 1 else 0,
+            **latencies.summary(),
             "errors": errors,
             "success_rate": (iterations - errors) / iterations * 100,
-            "avg_time_per_transaction": statistics.mean(response_times) / batch_size
+            "avg_time_per_transaction": latencies.mean_ns / NS_PER_MS / batch_size,
+            "throughput": batch_size / (latencies.mean_ns / 1_000_000_000)
         }
         
         print(f"\nPerformance Statistics:")
@@ -172,6 +282,101 @@ def test_batch_prediction(batch_size: int = 10, iterations: int = 10) -> Dict:
         print(f"  Min Response Time: {stats['min']:.2f} ms")
         print(f"  Max Response Time: {stats['max']:.2f} ms")
         print(f"  Avg Time per Transaction: {stats['avg_time_per_transaction']:.2f} ms")
+        print(f"  95th Percentile: {stats['p95']:.2f} ms")
+        print(f"  99th Percentile: {stats['p99']:.2f} ms")
+        print(f"  Errors: {stats['errors']}")
+        print(f"  Success Rate: {stats['success_rate']:.2f}%")
+        
+        return stats
+    else:
+        print("No successful responses!")
+        return None
+
+
+def test_batch_size_sweep(session: requests.Session, batch_sizes: Tuple[int, ...] = (1, 4, 16, 64, 100), iterations: int = 50) -> Dict[int, Dict]:
+    """Run the batch test over increasing batch sizes to find where throughput stops growing"""
+    sweep = {}
+    for batch_size in batch_sizes:
+        stats = test_batch_prediction(session, batch_size=batch_size, iterations=iterations)
+        if stats:
+            sweep[batch_size] = stats
+    
+    print(f"\n{'='*60}")
+    print("Batch Size Sweep")
+    print(f"{'='*60}")
+    for batch_size, stats in sweep.items():
+        print(f"  batch_size={batch_size:>3}: {stats['throughput']:>7.0f} transactions/s, "
+              f"mean={stats['mean']:.2f} ms, p95={stats['p95']:.2f} ms, p99={stats['p99']:.2f} ms")
+    
+    return sweep
+
+
+async def run_load(client: httpx.AsyncClient, payload: Dict, n: int, concurrency: int) -> Tuple[LatencyStats, int]:
+    """Send n /predict requests with at most `concurrency` in flight; returns (response times, errors)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    body = orjson.dumps(payload)
+    headers = {"Content-Type": "application/json"}
+    latencies = LatencyStats()
+    errors = 0
+    
+    async def send():
+        nonlocal errors
+        async with semaphore:
+            try:
+                start_ns = time.perf_counter_ns()
+                response = await client.post("/predict", content=body, headers=headers)
+                elapsed = time.perf_counter_ns() - start_ns
+            except httpx.HTTPError:
+                errors += 1
+                return
+            if response.status_code == 200:
+                latencies.record(elapsed)
+            else:
+                errors += 1
+    
+    await asyncio.gather(*(send() for _ in range(n)))
+    return latencies, errors
+
+
+def test_concurrent_prediction(transaction: Dict, concurrency: int = 50, total: int = 1000, http2: bool = False) -> Dict:
+    """Test single prediction endpoint latency and throughput under concurrent load
+
+    With http2, requests are multiplexed over a few HTTP/2 connections (cleartext, prior
+    knowledge) instead of one HTTP/1.1 connection each. That needs the h2 package
+    (httpx[http2]) and an HTTP/2 server such as hypercorn; uvicorn only speaks HTTP/1.1
+    """
+    print(f"\n{'='*60}")
+    print(f"Testing Concurrent Predictions ({total} requests, concurrency={concurrency}, {'HTTP/2' if http2 else 'HTTP/1.1'})")
+    print(f"{'='*60}")
+    
+    async def run():
+        connections = min(concurrency, HTTP2_CONNECTIONS) if http2 else concurrency
+        limits = httpx.Limits(max_keepalive_connections=connections, max_connections=connections)
+        async with httpx.AsyncClient(base_url=API_BASE_URL, limits=limits, timeout=10, http1=not http2, http2=http2) as client:
+            start_ns = time.perf_counter_ns()
+            latencies, errors = await run_load(client, transaction, total, concurrency)
+            return latencies, errors, time.perf_counter_ns() - start_ns
+    
+    try:
+        latencies, errors, elapsed = asyncio.run(run())
+    except ImportError as e:
+        print(f"HTTP/2 needs the h2 package (pip install 'httpx[http2]'): {str(e)}")
+        return None
+    
+    if latencies.count:
+        stats = {
+            **latencies.summary(),
+            "throughput": latencies.count / (elapsed / 1_000_000_000),
+            "errors": errors,
+            "success_rate": (total - errors) / total * 100
+        }
+        
+        print(f"\nPerformance Statistics:")
+        print(f"  Mean Response Time: {stats['mean']:.2f} ms")
+        print(f"  50th Percentile: {stats['median']:.2f} ms")
+        print(f"  95th Percentile: {stats['p95']:.2f} ms")
+        print(f"  99th Percentile: {stats['p99']:.2f} ms")
+        print(f"  Throughput: {stats['throughput']:.0f} requests/s")
         print(f"  Errors: {stats['errors']}")
         print(f"  Success Rate: {stats['success_rate']:.2f}%")
         
@@ -181,7 +386,7 @@ def test_batch_prediction(batch_size: int = 10, iterations: int = 10) -> Dict:
         return None
 
 
-def test_different_transaction_types():
+def test_different_transaction_types(session: requests.Session):
     """Test API with different types of transactions"""
     print(f"\n{'='*60}")
     print("Testing Different Transaction Types")
@@ -216,7 +421,7 @@ def test_different_transaction_types():
             "transaction": create_transaction(
                 transaction_amount=5000.00,
                 account_balance=1000.00,
-                transaction_type="Transfer",
+                transaction_type="Bank Transfer",
                 risk_score=0.95,
                 previous_fraudulent_activity=3,
                 failed_transaction_count_7d=5.0,
@@ -239,7 +444,7 @@ def test_different_transaction_types():
             "transaction": create_transaction(
                 transaction_amount=2000.00,
                 account_balance=15000.00,
-                transaction_type="Payment",
+                transaction_type="Online",
                 merchant_category="Travel",
                 card_type="Mastercard",
                 risk_score=0.60
@@ -247,21 +452,28 @@ def test_different_transaction_types():
         }
     ]
     
+    def run_case(test_case: Dict):
+        """Post one case, timing it inside the worker thread; returns (status, body, elapsed ms)"""
+        prepared = prepare_post(session, f"{API_BASE_URL}/predict", orjson.dumps(test_case['transaction']))
+        start_ns = time.perf_counter_ns()
+        response = session.send(prepared, timeout=10)
+        elapsed = (time.perf_counter_ns() - start_ns) / NS_PER_MS
+        return response.status_code, response.content, elapsed
+    
+    # The cases are independent, so they share the session's connection pool in parallel
+    with ThreadPoolExecutor(max_workers=len(test_cases)) as executor:
+        futures = [executor.submit(run_case, test_case) for test_case in test_cases]
+    
     results = []
     
-    for test_case in test_cases:
+    # Report in case order once every request has finished
+    for test_case, future in zip(test_cases, futures):
         print(f"\n{test_case['name']}:")
         try:
-            start_time = time.time()
-            response = requests.post(
-                f"{API_BASE_URL}/predict",
-                json=test_case['transaction'],
-                timeout=10
-            )
-            elapsed = (time.time() - start_time) * 1000
+            status_code, content, elapsed = future.result()
             
-            if response.status_code == 200:
-                data = response.json()
+            if status_code == 200:
+                data = orjson.loads(content)
                 result = {
                     "name": test_case['name'],
                     "fraud_probability": data['fraud_probability'],
@@ -276,50 +488,82 @@ def test_different_transaction_types():
                 print(f"  Confidence: {result['confidence']:.4f}")
                 print(f"  Response Time: {result['response_time_ms']:.2f} ms")
             else:
-                print(f"  Error: {response.status_code}")
+                print(f"  Error: {status_code}")
         except Exception as e:
             print(f"  Exception: {str(e)}")
     
     return results
 
 
-def check_health():
-    """Check API health"""
-    try:
-        response = requests.get(f"{API_BASE_URL}/health", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            print(f"API Health: {data['status']}")
-            print(f"Model Loaded: {data['model_loaded']}")
-            return data['model_loaded']
-        else:
-            print(f"Health check failed: {response.status_code}")
+def wait_healthy(session: requests.Session, timeout_s: float = 30) -> bool:
+    """Poll /health with exponential backoff until the API reports its model loaded"""
+    deadline = time.monotonic() + timeout_s
+    delay = 0.05
+    last_error = None
+    
+    while True:
+        try:
+            response = session.get(f"{API_BASE_URL}/health", timeout=2)
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                if data['model_loaded']:
+                    print(f"API Health: {data['status']}")
+                    print(f"Model Loaded: {data['model_loaded']}")
+                    return True
+                last_error = "model not loaded"
+            else:
+                last_error = f"status {response.status_code}"
+        except requests.RequestException as e:
+            last_error = str(e)
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            # Something other than the API answered on the port; keep waiting
+            last_error = "unexpected /health response"
+        
+        if time.monotonic() + delay > deadline:
+            print(f"Health check failed after {timeout_s:.0f} s: {last_error}")
             return False
-    except Exception as e:
-        print(f"Health check error: {str(e)}")
-        return False
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
 
 
 def main():
     """Main performance testing function"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent requests in the load test")
+    parser.add_argument("--requests", type=int, default=1000, help="Total requests in the load test")
+    parser.add_argument("--wait", type=float, default=30, help="Seconds to wait for the API to become healthy")
+    parser.add_argument("--http2", action="store_true", help="Run the load test over HTTP/2 (needs httpx[http2] and an HTTP/2 server such as hypercorn)")
+    parser.add_argument("--pin-cpu", type=int, help="Pin the load generator to this CPU (only on an otherwise idle machine)")
+    args = parser.parse_args()
+    
+    if args.pin_cpu is not None:
+        pin_to_cpu(args.pin_cpu)
+    
     print("="*60)
     print("Fraud Detection API Performance Testing")
     print("="*60)
     
-    # Check health first
-    if not check_health():
-        print("API is not healthy. Please start the API first.")
-        return
-    
-    # Test with standard transaction
-    standard_transaction = create_transaction()
-    single_stats = test_single_prediction(standard_transaction, iterations=100)
-    
-    # Test batch prediction
-    batch_stats = test_batch_prediction(batch_size=10, iterations=10)
-    
-    # Test different transaction types
-    type_results = test_different_transaction_types()
+    # One session (and connection) for every request
+    with create_session() as session:
+        # Wait for the API (it may still be loading the model)
+        if not wait_healthy(session, args.wait):
+            print("API is not healthy. Please start the API first.")
+            return
+        
+        # Test with standard transaction
+        single_stats = test_single_prediction(session, STANDARD_TRANSACTION, iterations=100)
+        
+        # Test batch prediction
+        batch_stats = test_batch_prediction(session, batch_size=10, iterations=10)
+        
+        # Sweep batch sizes to locate the throughput knee
+        sweep_stats = test_batch_size_sweep(session)
+        
+        # Test concurrent load (uses its own async connection pool)
+        concurrent_stats = test_concurrent_prediction(STANDARD_TRANSACTION, args.concurrency, args.requests, args.http2)
+        
+        # Test different transaction types
+        type_results = test_different_transaction_types(session)
     
     # Summary
     print(f"\n{'='*60}")
@@ -338,6 +582,17 @@ def main():
         print(f"  Avg Time per Transaction: {batch_stats['avg_time_per_transaction']:.2f} ms")
         print(f"  Success Rate: {batch_stats['success_rate']:.2f}%")
     
+    if sweep_stats:
+        best_size = max(sweep_stats, key=lambda size: sweep_stats[size]['throughput'])
+        print(f"\nBatch Size Sweep:")
+        print(f"  Best Throughput: {sweep_stats[best_size]['throughput']:.0f} transactions/s (batch_size={best_size})")
+    
+    if concurrent_stats:
+        print(f"\nConcurrent Prediction ({args.requests} requests, concurrency={args.concurrency}):")
+        print(f"  Throughput: {concurrent_stats['throughput']:.0f} requests/s")
+        print(f"  99th Percentile: {concurrent_stats['p99']:.2f} ms")
+        print(f"  Success Rate: {concurrent_stats['success_rate']:.2f}%")
+    
     print(f"\nDifferent Transaction Types Tested: {len(type_results)}")
     for result in type_results:
         print(f"  {result['name']}: {result['fraud_probability']:.4f} probability")
@@ -0,0 +1,51 @@
+"""
+Shared fixtures for the Fraud Detection API tests
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from app import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Test client shared by the whole session, so the model loads (lifespan runs) once"""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def model_loaded(client) -> bool:
+    """Whether the API loaded its model, asked once per session"""
+    return client.get("/health").json()["model_loaded"]
+
+
+@pytest.fixture
+def requires_model(model_loaded):
+    """Skip the test when the API started without a model"""
+    if not model_loaded:
+        pytest.skip("Model not loaded")
+
+
+@pytest.fixture(scope="session")
+def valid_transaction():
+    """Valid transaction data (shared: copy it before changing fields)"""
+    return {
+        "transaction_amount": 150.50,
+        "account_balance": 5000.00,
+        "transaction_type": "POS",
+        "device_type": "Mobile",
+        "location": "London",
+        "merchant_category": "Restaurants",
+        "ip_address_flag": 0,
+        "previous_fraudulent_activity": 0,
+        "daily_transaction_count": 5,
+        "avg_transaction_amount_7d": 120.30,
+        "failed_transaction_count_7d": 0.0,
+        "card_type": "Visa",
+        "card_age": 365,
+        "transaction_distance": 1500.25,
+        "authentication_method": "PIN",
+        "risk_score": 0.15,
+        "is_weekend": 0
+    }
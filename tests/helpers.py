@@ -0,0 +1,20 @@
+"""
+Shared helpers for the Fraud Detection API tests
+"""
+
+from functools import lru_cache
+from pathlib import Path
+
+import pytest
+
+MODEL_FILE = Path(__file__).resolve().parent.parent / "Models" / "fraud_detection_model.pkl"
+
+
+@lru_cache(maxsize=1)
+def model_file_available() -> bool:
+    """Whether the trained model is on disk (stat'ed once per process)"""
+    return MODEL_FILE.is_file()
+
+
+# For tests that load the model file themselves
+needs_model = pytest.mark.skipif(not model_file_available(), reason="Model file not available")
@@ -3,46 +3,22 @@ Unit tests for Fraud Detection API
 """
 
 import pytest
-from fastapi.testclient import TestClient
-from app import app
 import time
-import os
-
-client = TestClient(app)
-
-# Check if model is available
-def is_model_available():
-    """Check if model is loaded by querying health endpoint or checking file"""
-    # First check if file exists
-    if not os.path.exists("Models/fraud_detection_model.pkl"):
-        return False
-    # Then check health endpoint
-    try:
-        response = client.get("/health")
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("model_loaded", False)
-    except Exception:
-        pass
-    return False
-
-# Create a pytest fixture for model availability
-@pytest.fixture(scope="session")
-def model_available():
-    """Fixture to check if model is available"""
-    return is_model_available()
-
-# For use in skipif decorators
-def pytest_configure(config):
-    """Configure pytest to check model availability"""
-    # This runs once at test collection time
-    pass
+import json
+from datetime import datetime
+import joblib
+import numpy as np
+import app as api
+from app import TransactionRequest, find_fraud_class_index
+from onnx_model import OnnxModel
+from preprocess_kernels import fill_features
+from tests.helpers import MODEL_FILE, needs_model
 
 
 class TestHealthCheck:
     """Test health check endpoint"""
     
-    def test_health_check(self):
+    def test_health_check(self, client):
         """Test health endpoint returns correct status"""
         response = client.get("/health")
         assert response.status_code == 200
@@ -51,7 +27,7 @@ class TestHealthCheck:
         assert "model_loaded" in data
         assert "timestamp" in data
     
-    def test_root_endpoint(self):
+    def test_root_endpoint(self, client):
         """Test root endpoint"""
         response = client.get("/")
         assert response.status_code == 200
@@ -73,31 +49,8 @@ class TestHealthCheck:
 class TestSinglePrediction:
     """Test single transaction prediction"""
     
-    @pytest.fixture
-    def valid_transaction(self):
-        """Valid transaction data"""
-        return {
-            "transaction_amount": 150.50,
-            "account_balance": 5000.00,
-            "transaction_type": "POS",
-            "device_type": "Mobile",
-            "location": "London",
-            "merchant_category": "Restaurants",
-            "ip_address_flag": 0,
-            "previous_fraudulent_activity": 0,
-            "daily_transaction_count": 5,
-            "avg_transaction_amount_7d": 120.30,
-            "failed_transaction_count_7d": 0.0,
-            "card_type": "Visa",
-            "card_age": 365,
-            "transaction_distance": 1500.25,
-            "authentication_method": "PIN",
-            "risk_score": 0.15,
-            "is_weekend": 0
-        }
-    
-    @pytest.mark.skipif(not is_model_available(), reason="Model file not available")
-    def test_valid_prediction(self, valid_transaction):
+    @pytest.mark.usefixtures("requires_model")
+    def test_valid_prediction(self, client, valid_transaction):
         """Test prediction with valid data"""
         response = client.post("/predict", json=valid_transaction)
         assert response.status_code == 200
@@ -111,12 +64,15 @@ class TestSinglePrediction:
         assert isinstance(data["is_fraud"], bool)
         assert 0 <= data["confidence"] <= 1
     
-    @pytest.mark.skipif(not is_model_available(), reason="Model file not available")
-    def test_prediction_response_time(self, valid_transaction):
+    @pytest.mark.usefixtures("requires_model")
+    def test_prediction_response_time(self, client, valid_transaction):
         """Test that response time is reasonable"""
-        start = time.time()
+        # TestClient already dispatches straight to the ASGI app in-process (no TCP);
+        # it is kept over an in-loop httpx client because a second lifespan would
+        # replace the batching queue the session client's requests are served from
+        start = time.perf_counter()
         response = client.post("/predict", json=valid_transaction)
-        elapsed = time.time() - start
+        elapsed = time.perf_counter() - start
         
         assert response.status_code == 200
         data = response.json()
@@ -124,7 +80,7 @@ class TestSinglePrediction:
         assert data["response_time_ms"] < 5000
         assert elapsed < 5
     
-    def test_missing_field(self):
+    def test_missing_field(self, client):
         """Test prediction with missing required field"""
         incomplete_transaction = {
             "transaction_amount": 150.50,
@@ -133,83 +89,47 @@ class TestSinglePrediction:
         }
         response = client.post("/predict", json=incomplete_transaction)
         assert response.status_code == 422  # Validation error
-    
-    def test_invalid_transaction_type(self, valid_transaction):
-        """Test prediction with invalid transaction type"""
-        valid_transaction["transaction_type"] = "InvalidType"
-        response = client.post("/predict", json=valid_transaction)
-        # If model not loaded, get 503; if loaded, get 422 (validation error)
-        assert response.status_code in [422, 503]
-    
-    def test_invalid_device_type(self, valid_transaction):
-        """Test prediction with invalid device type"""
-        valid_transaction["device_type"] = "InvalidDevice"
-        response = client.post("/predict", json=valid_transaction)
-        # If model not loaded, get 503; if loaded, get 422 (validation error)
-        assert response.status_code in [422, 503]
-    
-    def test_invalid_authentication_method(self, valid_transaction):
-        """Test prediction with invalid authentication method"""
-        valid_transaction["authentication_method"] = "InvalidMethod"
-        response = client.post("/predict", json=valid_transaction)
-        # If model not loaded, get 503; if loaded, get 422 (validation error)
-        assert response.status_code in [422, 503]
-    
-    def test_invalid_card_type(self, valid_transaction):
-        """Test prediction with invalid card type"""
-        valid_transaction["card_type"] = "InvalidCard"
-        response = client.post("/predict", json=valid_transaction)
+
+    def test_malformed_json(self, client):
+        """Test prediction with a body that is not valid JSON"""
+        response = client.post(
+            "/predict",
+            content=b'{"transaction_amount": 150.50,',
+            headers={"Content-Type": "application/json"}
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.parametrize("field,value", [
+        ("transaction_type", "InvalidType"),
+        ("transaction_type", "Payment"),  # Not a training category
+        ("device_type", "InvalidDevice"),
+        ("authentication_method", "InvalidMethod"),
+        ("card_type", "InvalidCard"),
+        ("ip_address_flag", 2),  # Should be 0 or 1
+    ])
+    def test_invalid_categorical(self, client, valid_transaction, field, value):
+        """Test prediction with an invalid categorical value"""
+        transaction = {**valid_transaction, field: value}
+        response = client.post("/predict", json=transaction)
         # If model not loaded, get 503; if loaded, get 422 (validation error)
         assert response.status_code in [422, 503]
     
-    def test_negative_transaction_amount(self, valid_transaction):
-        """Test prediction with negative transaction amount"""
-        valid_transaction["transaction_amount"] = -100
-        response = client.post("/predict", json=valid_transaction)
-        assert response.status_code == 422
-    
-    def test_invalid_risk_score(self, valid_transaction):
-        """Test prediction with invalid risk score"""
-        valid_transaction["risk_score"] = 1.5  # Should be 0-1
-        response = client.post("/predict", json=valid_transaction)
+    @pytest.mark.parametrize("field,value", [
+        ("transaction_amount", -100),
+        ("risk_score", 1.5),  # Should be 0-1
+    ])
+    def test_out_of_range_value(self, client, valid_transaction, field, value):
+        """Test prediction with an out-of-range numeric value"""
+        transaction = {**valid_transaction, field: value}
+        response = client.post("/predict", json=transaction)
         assert response.status_code == 422
-    
-    def test_invalid_ip_flag(self, valid_transaction):
-        """Test prediction with invalid IP flag"""
-        valid_transaction["ip_address_flag"] = 2  # Should be 0 or 1
-        response = client.post("/predict", json=valid_transaction)
-        # If model not loaded, get 503; if loaded, get 422 (validation error)
-        assert response.status_code in [422, 503]
 
 
 class TestBatchPrediction:
     """Test batch prediction endpoint"""
     
-    @pytest.fixture
-    def valid_transaction(self):
-        """Valid transaction data"""
-        return {
-            "transaction_amount": 150.50,
-            "account_balance": 5000.00,
-            "transaction_type": "POS",
-            "device_type": "Mobile",
-            "location": "London",
-            "merchant_category": "Restaurants",
-            "ip_address_flag": 0,
-            "previous_fraudulent_activity": 0,
-            "daily_transaction_count": 5,
-            "avg_transaction_amount_7d": 120.30,
-            "failed_transaction_count_7d": 0.0,
-            "card_type": "Visa",
-            "card_age": 365,
-            "transaction_distance": 1500.25,
-            "authentication_method": "PIN",
-            "risk_score": 0.15,
-            "is_weekend": 0
-        }
-    
-    @pytest.mark.skipif(not is_model_available(), reason="Model file not available")
-    def test_batch_prediction(self, valid_transaction):
+    @pytest.mark.usefixtures("requires_model")
+    def test_batch_prediction(self, client, valid_transaction):
         """Test batch prediction with multiple transactions"""
         batch_request = {
             "transactions": [valid_transaction, valid_transaction, valid_transaction]
@@ -224,16 +144,49 @@ class TestBatchPrediction:
         assert len(data["predictions"]) == 3
         assert data["total_transactions"] == 3
     
-    @pytest.mark.skipif(not is_model_available(), reason="Model file not available")
-    def test_batch_prediction_empty(self):
+    @pytest.mark.usefixtures("requires_model")
+    def test_batch_prediction_empty(self, client):
         """Test batch prediction with empty list"""
         batch_request = {"transactions": []}
         response = client.post("/predict/batch", json=batch_request)
         assert response.status_code == 200
         data = response.json()
         assert data["total_transactions"] == 0
-    
-    def test_batch_prediction_too_many(self, valid_transaction):
+
+    @pytest.mark.usefixtures("requires_model")
+    def test_batch_matches_single_predictions(self, client, valid_transaction):
+        """Test vectorized batch predictions match single predictions"""
+        high_risk = {**valid_transaction, "risk_score": 0.9, "failed_transaction_count_7d": 3.0}
+        batch_request = {"transactions": [valid_transaction, high_risk]}
+        response = client.post("/predict/batch", json=batch_request)
+        assert response.status_code == 200
+        batch_predictions = response.json()["predictions"]
+        for transaction, batch_prediction in zip([valid_transaction, high_risk], batch_predictions):
+            single = client.post("/predict", json=transaction).json()
+            assert batch_prediction["fraud_probability"] == pytest.approx(single["fraud_probability"])
+            assert batch_prediction["is_fraud"] == single["is_fraud"]
+
+    @pytest.mark.usefixtures("requires_model")
+    def test_batch_prediction_stream(self, client, valid_transaction):
+        """Test streamed batch prediction returns one NDJSON line per transaction"""
+        batch_request = {"transactions": [valid_transaction] * 3}
+        response = client.post("/predict/batch/stream", json=batch_request)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert len(lines) == 3
+        for prediction in lines:
+            assert 0 <= prediction["fraud_probability"] <= 1
+            assert isinstance(prediction["is_fraud"], bool)
+            assert isinstance(prediction["response_time_ms"], float)  # Same JSON type as /predict/batch
+
+    def test_batch_prediction_stream_too_many(self, client, valid_transaction):
+        """Test streamed batch prediction rejects more than 100 transactions"""
+        batch_request = {"transactions": [valid_transaction] * 101}
+        response = client.post("/predict/batch/stream", json=batch_request)
+        assert response.status_code == 422
+
+    def test_batch_prediction_too_many(self, client, valid_transaction):
         """Test batch prediction with too many transactions"""
         batch_request = {
             "transactions": [valid_transaction] * 101  # More than max (100)
@@ -242,7 +195,7 @@ class TestBatchPrediction:
         # Pydantic validation may return 422, or app logic returns 400
         assert response.status_code in [400, 422]
     
-    def test_batch_prediction_mixed_validity(self, valid_transaction):
+    def test_batch_prediction_mixed_validity(self, client, valid_transaction):
         """Test batch prediction with mix of valid and invalid transactions"""
         invalid_transaction = valid_transaction.copy()
         invalid_transaction["transaction_type"] = "InvalidType"
@@ -258,8 +211,8 @@ class TestBatchPrediction:
 class TestDifferentTransactionTypes:
     """Test API with different types of transactions"""
     
-    @pytest.mark.skipif(not is_model_available(), reason="Model file not available")
-    def test_atm_withdrawal(self):
+    @pytest.mark.usefixtures("requires_model")
+    def test_atm_withdrawal(self, client):
         """Test ATM withdrawal transaction"""
         transaction = {
             "transaction_amount": 200.00,
@@ -283,8 +236,8 @@ class TestDifferentTransactionTypes:
         response = client.post("/predict", json=transaction)
         assert response.status_code == 200
     
-    @pytest.mark.skipif(not is_model_available(), reason="Model file not available")
-    def test_online_transaction(self):
+    @pytest.mark.usefixtures("requires_model")
+    def test_online_transaction(self, client):
         """Test online transaction"""
         transaction = {
             "transaction_amount": 75.50,
@@ -308,13 +261,13 @@ class TestDifferentTransactionTypes:
         response = client.post("/predict", json=transaction)
         assert response.status_code == 200
     
-    @pytest.mark.skipif(not is_model_available(), reason="Model file not available")
-    def test_high_risk_transaction(self):
+    @pytest.mark.usefixtures("requires_model")
+    def test_high_risk_transaction(self, client):
         """Test high-risk transaction"""
         transaction = {
             "transaction_amount": 5000.00,
             "account_balance": 1000.00,
-            "transaction_type": "Transfer",
+            "transaction_type": "Bank Transfer",
             "device_type": "Tablet",
             "location": "Unknown",
             "merchant_category": "Travel",
@@ -328,7 +281,9 @@ class TestDifferentTransactionTypes:
             "transaction_distance": 5000.00,
             "authentication_method": "Password",
             "risk_score": 0.95,
-            "is_weekend": 1
+            "is_weekend": 1,
+            "hour": 14,  # Fixed so the prediction doesn't depend on when the suite runs
+            "month": 6
         }
         response = client.post("/predict", json=transaction)
         assert response.status_code == 200
@@ -336,8 +291,8 @@ class TestDifferentTransactionTypes:
         # High risk transaction should have higher fraud probability
         assert data["fraud_probability"] > 0.5
     
-    @pytest.mark.skipif(not is_model_available(), reason="Model file not available")
-    def test_low_risk_transaction(self):
+    @pytest.mark.usefixtures("requires_model")
+    def test_low_risk_transaction(self, client):
         """Test low-risk transaction"""
         transaction = {
             "transaction_amount": 25.00,
@@ -356,7 +311,9 @@ class TestDifferentTransactionTypes:
             "transaction_distance": 100.00,
             "authentication_method": "Biometric",
             "risk_score": 0.05,
-            "is_weekend": 0
+            "is_weekend": 0,
+            "hour": 14,  # Fixed so the prediction doesn't depend on when the suite runs
+            "month": 6
         }
         response = client.post("/predict", json=transaction)
         assert response.status_code == 200
@@ -365,10 +322,11 @@ class TestDifferentTransactionTypes:
         assert data["fraud_probability"] < 0.5
 
 
+@pytest.mark.xdist_group("metrics")
 class TestMetrics:
-    """Test metrics endpoint"""
+    """Test metrics endpoint (kept on one worker)"""
     
-    def test_metrics_endpoint(self):
+    def test_metrics_endpoint(self, client):
         """Test metrics endpoint"""
         response = client.get("/metrics")
         assert response.status_code == 200
@@ -377,15 +335,107 @@ class TestMetrics:
         assert "timestamp" in data
 
 
+class TestModelInput:
+    """Test the float32 model input"""
+    
+    @pytest.fixture(scope="class")
+    def transactions(self):
+        """Synthetic transactions covering the model's feature ranges"""
+        rng = np.random.default_rng(0)
+        return [
+            TransactionRequest(
+                transaction_amount=round(float(rng.uniform(1, 2000)), 2),
+                avg_transaction_amount_7d=round(float(rng.uniform(1, 2000)), 2),
+                failed_transaction_count_7d=float(rng.integers(0, 5)),
+                daily_transaction_count=int(rng.integers(1, 15)),
+                risk_score=round(float(rng.uniform(0, 1)), 4),
+                card_age=int(rng.integers(0, 2000)),
+                hour=int(rng.integers(0, 24)),
+                month=int(rng.integers(1, 13))
+            )
+            for _ in range(500)
+        ]
+    
+    @needs_model
+    @pytest.mark.usefixtures("requires_model")
+    def test_float32_input_matches_float64(self, transactions):
+        """The served float32 path matches the joblib model on input built in float64"""
+        X32 = api.preprocess_batch(transactions, datetime.now())
+        assert X32.dtype == np.float32
+        assert X32.shape[1] == len(api.feature_index)
+        
+        # Same features computed straight into a float64 matrix, never rounded to float32
+        columns = {
+            field: np.array([getattr(t, field) for t in transactions], dtype=np.float64)
+            for field in ("failed_transaction_count_7d", "daily_transaction_count", "transaction_amount",
+                          "avg_transaction_amount_7d", "risk_score", "card_age", "hour", "month")
+        }
+        X64 = np.zeros(X32.shape, dtype=np.float64)
+        fill_features(X64, api.feature_columns, *columns.values())
+        
+        reference = joblib.load(MODEL_FILE).predict_proba(X64)
+        np.testing.assert_allclose(api.model.predict_proba(X32), reference, atol=1e-5)
+    
+    @needs_model
+    @pytest.mark.usefixtures("requires_model")
+    def test_onnx_matches_joblib(self, transactions):
+        """ONNX Runtime gives the joblib model's probabilities on the same input"""
+        if not isinstance(api.model, OnnxModel):
+            pytest.skip("API is not serving through ONNX Runtime")
+        X = api.preprocess_batch(transactions, datetime.now())
+        reference = joblib.load(MODEL_FILE).predict_proba(X.astype(np.float64))
+        # ONNX Runtime sums the tree outputs in float32 (observed difference below 1e-6)
+        np.testing.assert_allclose(api.model.predict_proba(X), reference, atol=1e-5)
+
+
+class TestFraudClass:
+    """Test locating the fraud class in the model's classes"""
+    
+    @pytest.mark.parametrize("classes,expected", [
+        ([0, 1], 1),
+        ([1, 0], 0),
+        ([False, True], 1),
+        (["0", "1"], 1),
+        (np.array([0, 1, 2]), 1),
+    ])
+    def test_fraud_class_index(self, classes, expected):
+        """Label 1 is found by value; other binary labels fall back to the second class"""
+        assert find_fraud_class_index(classes) == expected
+    
+    def test_unknown_fraud_class(self):
+        """A non-binary model without label 1 is rejected"""
+        with pytest.raises(ValueError):
+            find_fraud_class_index(["legit", "fraud", "review"])
+
+
+class TestSettings:
+    """Test reading counts from the environment"""
+    
+    @pytest.mark.parametrize("value,expected", [(None, 4), ("3", 3), ("0", 1), ("-2", 1)])
+    def test_env_count(self, monkeypatch, value, expected):
+        """Unset uses the default; values below 1 are raised to 1"""
+        if value is None:
+            monkeypatch.delenv("TEST_COUNT", raising=False)
+        else:
+            monkeypatch.setenv("TEST_COUNT", value)
+        assert api.env_count("TEST_COUNT", 4) == expected
+    
+    def test_env_count_not_integer(self, monkeypatch):
+        """A non-integer value names the setting in the error"""
+        monkeypatch.setenv("TEST_COUNT", "many")
+        with pytest.raises(ValueError, match="TEST_COUNT"):
+            api.env_count("TEST_COUNT", 4)
+
+
 class TestErrorHandling:
     """Test error handling"""
     
-    def test_nonexistent_endpoint(self):
+    def test_nonexistent_endpoint(self, client):
         """Test non-existent endpoint returns 404"""
         response = client.get("/nonexistent")
         assert response.status_code == 404
     
-    def test_invalid_json(self):
+    def test_invalid_json(self, client):
         """Test invalid JSON in request"""
         response = client.post("/predict", data="invalid json")
         assert response.status_code == 422
@@ -0,0 +1,77 @@
+"""
+Unit tests for the monitoring metrics
+"""
+
+import pytest
+import numpy as np
+import monitoring_config
+from monitoring_config import COUNTER_NAMES, MAX_RESPONSE_TIMES, get_metrics_summary, metrics, reset_metrics
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    """Start and end every test with empty metrics"""
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+class TestMetricsSummary:
+    """Test the response time summary"""
+
+    def test_keeps_most_recent_response_times(self):
+        """Only the last MAX_RESPONSE_TIMES samples are kept"""
+        times = np.random.default_rng(0).uniform(0.001, 0.5, MAX_RESPONSE_TIMES + 500)
+        metrics["response_times"].extend(times.tolist())
+
+        assert len(metrics["response_times"]) == MAX_RESPONSE_TIMES
+        assert list(metrics["response_times"]) == times[-MAX_RESPONSE_TIMES:].tolist()
+
+        kept = times[-MAX_RESPONSE_TIMES:]
+        summary = get_metrics_summary()
+        assert summary["avg_response_time"] == pytest.approx(kept.mean())
+        assert summary["min_response_time"] == kept.min()
+        assert summary["max_response_time"] == kept.max()
+
+    @pytest.mark.parametrize("count", [21, 100, MAX_RESPONSE_TIMES + 500])
+    def test_p95_response_time(self, count):
+        """p95 is the sorted sample at index int(n * 0.95), within np.percentile's 95th bracket"""
+        times = np.random.default_rng(count).uniform(0.001, 0.5, count)
+        metrics["response_times"].extend(times.tolist())
+        kept = times[-MAX_RESPONSE_TIMES:]
+
+        p95 = get_metrics_summary()["p95_response_time"]
+        assert p95 == sorted(kept)[int(kept.size * 0.95)]
+        assert np.percentile(kept, 95, method="lower") <= p95 <= np.percentile(kept, 95, method="higher")
+
+    @pytest.mark.parametrize("count", [1, 20])
+    def test_p95_needs_more_than_20_samples(self, count):
+        """p95 is None until there are more than 20 samples"""
+        metrics["response_times"].extend([0.01] * count)
+        assert get_metrics_summary()["p95_response_time"] is None
+
+    def test_empty_summary(self):
+        """With no samples, only counters and zero averages are reported"""
+        summary = get_metrics_summary()
+        assert summary["avg_response_time"] == 0
+        assert summary["error_rate"] == 0
+        assert "p95_response_time" not in summary
+
+
+class TestResetMetrics:
+    """Test resetting the metrics"""
+
+    def test_reset_keeps_imported_reference(self):
+        """This module's `from monitoring_config import metrics` sees the reset, and the deque keeps its bound"""
+        response_times = metrics["response_times"]
+        for name in COUNTER_NAMES:
+            metrics[name] += 3
+        response_times.extend([0.01, 0.02, 0.03])
+
+        reset_metrics()
+
+        assert metrics is monitoring_config.metrics
+        assert all(metrics[name] == 0 for name in COUNTER_NAMES)
+        assert metrics["response_times"] is response_times
+        assert len(response_times) == 0
+        assert response_times.maxlen == MAX_RESPONSE_TIMES